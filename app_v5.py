@@ -3,8 +3,225 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from scipy.stats import norm
+from scipy.special import ndtri
+from openpyxl import load_workbook
+import xlsxwriter
 import io
+import math
+import threading
+
+# ==============================
+# FUNÇÕES AUXILIARES
+# ==============================
+def adicionar_totais(matriz):
+    # Linha e coluna 'Total' (somas sobre todos os SKUs, inclusive os não mapeados), equivalentes a
+    # margins=True de um pivot_table. Linhas: X,Y,Z + Total; colunas: A,B,C (+ curvas não mapeadas) + Total
+    matriz['Total'] = matriz.sum(axis=1)
+    matriz.loc['Total'] = matriz.sum()
+    extras = [col for col in matriz.columns if col not in ('A', 'B', 'C', 'Total')]
+    return matriz.reindex(index=['X', 'Y', 'Z', 'Total'], columns=['A', 'B', 'C'] + extras + ['Total'], fill_value=0)
+
+
+def dividir_seguro(numerador, denominador, padrao):
+    # Divide apenas onde o denominador é positivo; as demais posições recebem 'padrao'
+    out = np.full(len(denominador), padrao, dtype=np.float64)
+    return np.divide(numerador, denominador, out=out, where=denominador > 0)
+
+
+def montar_texto_busca(df):
+    # SKU + descrição concatenados (separador \x1f) em maiúsculas, para uma única busca
+    return (df['SKU'] + '\x1f' + df['Descrição_do_Material'].astype(str)).str.upper()
+
+
+LIMITE_KERNEL_NUMBA = 50_000
+
+
+@st.cache_resource
+def carregar_kernel_ss():
+    # Ufunc Numba com o cálculo do SS fundido e paralelo, compilada uma vez por processo.
+    # Retorna None se o numba não estiver instalado (o cálculo segue com NumPy).
+    try:
+        import numba
+    except ImportError:
+        return None
+
+    @numba.vectorize(['f4(f4, f4, f4, f4, f4)', 'f8(f8, f8, f8, f8, f8)'], target='parallel', fastmath=True)
+    def kernel_ss(z, lt, sd, cm, slt):
+        periodo = lt + 1
+        return z * math.sqrt(periodo * sd * sd + cm * cm * slt * slt)
+
+    # Cada sessão do Streamlit roda em uma thread e a ufunc paralela não admite chamadas concorrentes
+    # (o threading layer 'workqueue' aborta o processo), então as chamadas são serializadas
+    trava = threading.Lock()
+
+    def calcular_ss(z, lt, sd, cm, slt):
+        with trava:
+            return kernel_ss(z, lt, sd, cm, slt)
+
+    return calcular_ss
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def calcular_estoque_seguranca(_resultado, chave_dados, niveis):
+    # Cálculo completo (tabela, matrizes de resumo e Excel do resultado), cacheado pelo hash dos
+    # dados filtrados (chave_dados) e pelos níveis da matriz; _resultado não entra na chave do cache.
+    # max_entries limita quantas combinações de filtro/matriz ficam em memória no servidor.
+    resultado = _resultado
+
+    # Cálculo vetorizado para todos os SKUs, baseado na matriz (linhas X,Y,Z; colunas A,B,C)
+    matriz = np.array(niveis)
+    # z (inversa da normal padrão, ndtri) calculado uma vez por célula da matriz
+    z_matriz = ndtri(matriz / 100.0)
+
+    # Os códigos das categorias indexam a matriz diretamente; códigos fora dela = valor não mapeado
+    ci = resultado['Criticidade'].cat.codes.to_numpy()
+    cj = resultado['Curva'].cat.codes.to_numpy()
+    nao_mapeado = (ci < 0) | (ci >= matriz.shape[0]) | (cj < 0) | (cj >= matriz.shape[1])
+    ci = np.where(nao_mapeado, 0, ci)
+    cj = np.where(nao_mapeado, 0, cj)
+    nivel = np.where(nao_mapeado, 95, matriz[ci, cj])  # Default se não mapeado
+    z = np.where(nao_mapeado, ndtri(0.95), z_matriz[ci, cj])
+
+    lt = resultado['Lead Time médio (meses)'].to_numpy()
+    sd = resultado['Desvio Padrão Consumo (un)'].to_numpy()
+    cm = resultado['Consumo Médio Mensal (un)'].to_numpy()
+    slt = resultado['Desvio Padrão LT (meses)'].to_numpy()
+
+    # Bases grandes usam o kernel Numba; nas pequenas a compilação JIT não compensa
+    kernel_ss = carregar_kernel_ss() if len(resultado) > LIMITE_KERNEL_NUMBA else None
+    if kernel_ss is not None:
+        ss = kernel_ss(z, lt, sd, cm, slt)
+    else:
+        periodo = lt + 1
+        ss = z * np.sqrt(periodo * sd * sd + cm * cm * slt * slt)
+
+    # assign devolve um novo DataFrame, sem escrever sobre a seleção recebida
+    resultado = resultado.assign(**{
+        'Nível de Serviço (%)': nivel,
+        'z': z.astype(np.float32),
+        'SS_Calculado': ss,
+        'SS_Arredondado': np.ceil(ss).astype(np.int64)
+    })
+
+    # Cobertura em meses
+    consumo = resultado['Consumo Médio Mensal (un)'].to_numpy()
+    ss_atual = resultado['Estoque de Segurança (unidades)'].to_numpy()
+    ss_arredondado = resultado['SS_Arredondado'].to_numpy()
+    resultado['Cobertura_Atual_Meses'] = dividir_seguro(ss_atual, consumo, 0)
+    resultado['Cobertura_Calculada_Meses'] = dividir_seguro(ss_arredondado, consumo, 0)
+
+    # Valor
+    resultado['Valor_SS_Calculado'] = resultado['SS_Arredondado'] * resultado['Valor Unit']
+    valor_atual = float((resultado['Estoque de Segurança (unidades)'].to_numpy(dtype=np.float64) *
+                         resultado['Valor Unit'].to_numpy()).sum())
+    valor_novo = float(resultado['Valor_SS_Calculado'].to_numpy().sum())
+
+    # Diferenças
+    resultado['Diferença_Unidades'] = resultado['SS_Arredondado'] - resultado['Estoque de Segurança (unidades)']
+    resultado['Diferença_%'] = (dividir_seguro(ss_arredondado, ss_atual, np.nan) - 1) * 100
+
+    # Tabela final (incluindo novas colunas)
+    colunas_tabela = [
+        'Empresa', 'Classe', 'SKU', 'Descrição_do_Material',
+        'Criticidade', 'Curva', 'Nível de Serviço (%)',
+        'Lead Time médio (meses)', 'Consumo Médio Mensal (un)',
+        'Estoque de Segurança (unidades)', 'SS_Arredondado',
+        'Diferença_Unidades', 'Diferença_%',
+        'Cobertura_Atual_Meses', 'Cobertura_Calculada_Meses',
+        'Valor Unit', 'Valor_SS_Calculado'
+    ]
+    # Arredondamento só das colunas float exibidas (inteiros não passam pelo round)
+    float_cols = resultado[colunas_tabela].select_dtypes('float').columns
+    resultado[float_cols] = resultado[float_cols].round(2)
+    tabela = resultado[colunas_tabela]
+
+    tabela = tabela.rename(columns={
+        'Estoque de Segurança (unidades)': 'SS Atual',
+        'SS_Arredondado': 'SS Calculado',
+        'Valor_SS_Calculado': 'Valor SS Calculado (R$)',
+        'Cobertura_Atual_Meses': 'Cobertura Atual (meses)',
+        'Cobertura_Calculada_Meses': 'Cobertura Calculada (meses)'
+    })
+
+    # Agregação única por (Criticidade, Curva); a média da cobertura é derivada de soma / contagem
+    resumo = tabela.groupby(['Criticidade', 'Curva'], observed=True, dropna=False).agg(
+        valor=('Valor SS Calculado (R$)', 'sum'),
+        cobertura=('Cobertura Calculada (meses)', 'sum'),
+        n=('SKU', 'count')
+    )
+    soma_valor = adicionar_totais(resumo['valor'].unstack('Curva', fill_value=0))
+    soma_cobertura = adicionar_totais(resumo['cobertura'].unstack('Curva', fill_value=0))
+    contagem = adicionar_totais(resumo['n'].unstack('Curva', fill_value=0))
+
+    matriz_valor = soma_valor.rename_axis(None, axis=1)
+    matriz_cobertura = (soma_cobertura / contagem).fillna(0).rename_axis(None, axis=1)
+    matriz_count = contagem.rename_axis(None, axis=1)
+
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
+        tabela.to_excel(writer, index=False, sheet_name='Resultado')
+
+    nao_mapeados = resultado.loc[nao_mapeado, ['SKU', 'Criticidade', 'Curva']]
+    return tabela, matriz_valor, matriz_cobertura, matriz_count, valor_atual, valor_novo, nao_mapeados, buffer.getvalue()
+
+
+def resumir_dados(df):
+    # Estatísticas da visão geral (chamada só dentro de preparar_dados, uma vez por arquivo)
+    valor_total_estoque = float((df['Estoque inicial (unidades)'].to_numpy(dtype=np.float64) *
+                                 df['Valor Unit'].to_numpy()).sum())
+    return df['SKU'].nunique(), sorted(df['Empresa'].unique().tolist()), valor_total_estoque
+
+
+@st.cache_data
+def gerar_template(colunas):
+    # Template vazio: apenas o cabeçalho, escrito em streaming com xlsxwriter
+    buffer = io.BytesIO()
+    wb = xlsxwriter.Workbook(buffer, {'constant_memory': True})
+    wb.add_worksheet('dados').write_row(0, 0, colunas)
+    wb.close()
+    return buffer.getvalue()
+
+
+def ler_planilha(file_bytes):
+    # Leitura da sheet 'dados' com nomes de colunas normalizados (chamada só dentro de preparar_dados)
+    try:
+        df = pd.read_excel(io.BytesIO(file_bytes), sheet_name="dados", engine="calamine")
+    except (ImportError, ValueError):
+        # Sem python-calamine (ou pandas < 2.2, que não conhece o engine): openpyxl em modo read_only
+        wb = load_workbook(io.BytesIO(file_bytes), read_only=True, data_only=True)
+        try:
+            linhas = wb["dados"].iter_rows(values_only=True)
+            cabecalho = next(linhas, ())
+            df = pd.DataFrame(list(linhas), columns=cabecalho).dropna(how='all')
+        finally:
+            wb.close()
+    df.columns = df.columns.str.strip()
+    return df
+
+
+@st.cache_data
+def preparar_dados(file_bytes, num_cols, str_cols, int_cols):
+    # Leitura, conversão de tipos e preenchimento de nulos, memoizados por arquivo.
+    # Se faltar uma coluna obrigatória, retorna apenas o nome dela.
+    df = ler_planilha(file_bytes)
+    for col in num_cols + str_cols:
+        if col not in df.columns:
+            return None, None, None, col
+    for col in num_cols:
+        # Estoques em unidades usam o menor inteiro que comporta os dados; as entradas do SS e o
+        # Valor Unit ficam em float64 (float32 mudaria o arredondamento do SS calculado)
+        df[col] = pd.to_numeric(df[col], errors='coerce', downcast='integer' if col in int_cols else None)
+    for col in str_cols:
+        df[col] = df[col].astype(str).str.upper()  # Padronizar para maiúsculas
+    df = df.fillna(0)
+    # Categorias X,Y,Z / A,B,C primeiro (códigos 0-2, usados como índice da matriz); valores fora da
+    # lista viram categorias extras, preservando o código original para avisos, tabela e Excel
+    for col, categorias in (('Criticidade', ['X', 'Y', 'Z']), ('Curva', ['A', 'B', 'C'])):
+        valores = df[col].astype(str)  # vazios já viraram 0 no fillna
+        extras = sorted(set(valores.unique()) - set(categorias))
+        df[col] = valores.astype(pd.CategoricalDtype(categorias + extras))
+    # Texto de busca e visão geral montados junto com os dados, no mesmo cache por arquivo
+    return df, montar_texto_busca(df), resumir_dados(df), None
 
 # ==============================
 # CONFIGURAÇÃO DA PÁGINA
@@ -37,15 +254,9 @@ columns_template = [
     'parametros', 'Valor Unit', 'Criticidade', 'Curva'
 ]
 
-df_template = pd.DataFrame(columns=columns_template)
-buffer_template = io.BytesIO()
-with pd.ExcelWriter(buffer_template, engine='openpyxl') as writer:
-    df_template.to_excel(writer, index=False, sheet_name='dados')
-buffer_template.seek(0)
-
 st.download_button(
     label="Baixar template Excel (preencha na sheet 'dados')",
-    data=buffer_template,
+    data=gerar_template(columns_template),
     file_name="template_dados_skus.xlsx",
     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
 )
@@ -68,48 +279,35 @@ if uploaded_file is None:
     st.info("Faça upload do arquivo para prosseguir.")
     st.stop()
 
-# Carregamento dinâmico
-try:
-    df = pd.read_excel(uploaded_file, sheet_name="dados")
-except Exception as e:
-    st.error(f"Erro ao carregar: {e}. Verifique a sheet 'dados'.")
-    st.stop()
-
-df.columns = df.columns.str.strip()
 num_cols = [
     'Lead Time médio (meses)', 'Desvio Padrão LT (meses)',
     'Consumo Médio Mensal (un)', 'Desvio Padrão Consumo (un)',
     'Valor Unit', 'Estoque inicial (unidades)', 'Estoque de Segurança (unidades)'
 ]
 str_cols = ['Criticidade', 'Curva', 'SKU']
+int_cols = ['Estoque inicial (unidades)', 'Estoque de Segurança (unidades)']
 
-for col in num_cols:
-    if col in df.columns:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-    else:
-        st.error(f"Coluna obrigatória ausente: {col}")
-        st.stop()
-
-for col in str_cols:
-    if col in df.columns:
-        df[col] = df[col].astype(str).str.upper()  # Padronizar para maiúsculas
-    else:
-        st.error(f"Coluna obrigatória ausente: {col}")
-        st.stop()
+# Carregamento dinâmico (cacheado pelo conteúdo do arquivo)
+try:
+    df, texto_busca, visao_geral, coluna_ausente = preparar_dados(uploaded_file.getvalue(), num_cols, str_cols, int_cols)
+except Exception as e:
+    st.error(f"Erro ao carregar: {e}. Verifique a sheet 'dados'.")
+    st.stop()
 
-df = df.fillna(0)
+if coluna_ausente:
+    st.error(f"Coluna obrigatória ausente: {coluna_ausente}")
+    st.stop()
 
 # ==============================
 # SIDEBAR - VISÃO GERAL
 # ==============================
 st.sidebar.header("Visão Geral dos Dados Carregados")
-df['Valor_Estoque_Inicial'] = df['Estoque inicial (unidades)'] * df['Valor Unit']
-valor_total_estoque = df['Valor_Estoque_Inicial'].sum()
+total_skus, empresas_sorted, valor_total_estoque = visao_geral
 
-st.sidebar.metric("Total de SKUs únicos", f"{df['SKU'].nunique():,}")
-st.sidebar.metric("Total de empresas", df['Empresa'].nunique())
+st.sidebar.metric("Total de SKUs únicos", f"{total_skus:,}")
+st.sidebar.metric("Total de empresas", len(empresas_sorted))
 st.sidebar.metric("Valor total do estoque atual", f"R$ {valor_total_estoque:,.0f}")
-st.sidebar.write("**Empresas:** " + ", ".join(sorted(df['Empresa'].unique())))
+st.sidebar.write("**Empresas:** " + ", ".join(empresas_sorted))
 
 # ==============================
 # CONFIGURAÇÃO DA MATRIZ DE NÍVEIS DE SERVIÇO
@@ -150,111 +348,53 @@ st.info("Edite os valores acima (50% a 99%). Linhas: Criticidade (X,Y,Z). Coluna
 st.header("Filtros")
 col_emp, col_busca = st.columns(2)
 with col_emp:
-    empresas = st.multiselect("Empresas", options=sorted(df['Empresa'].unique()), default=sorted(df['Empresa'].unique()))
+    empresas = st.multiselect("Empresas", options=empresas_sorted, default=empresas_sorted)
 
 with col_busca:
     busca = st.text_input("Buscar SKU ou descrição")
 
-df_filtrado = df[df['Empresa'].isin(empresas)].copy()
+# Filtros combinados em uma única máscara; o DataFrame só é copiado no cálculo
+filtro = df['Empresa'].isin(empresas)
 
 if busca:
-    mask = (df_filtrado['SKU'].str.contains(busca, case=False, na=False) |
-            df_filtrado['Descrição_do_Material'].str.contains(busca, case=False, na=False))
-    df_filtrado = df_filtrado[mask]
+    filtro &= texto_busca.str.contains(busca.upper(), regex=False)
 
-skus_selecionados = st.multiselect("SKUs específicos (vazio = todos)", options=sorted(df_filtrado['SKU'].unique()))
+skus_selecionados = st.multiselect("SKUs específicos (vazio = todos)", options=sorted(df.loc[filtro, 'SKU'].unique()))
 
 # ==============================
 # CÁLCULO
 # ==============================
 if st.button("Calcular Estoque de Segurança", type="primary", use_container_width=True):
 
-    resultado = df_filtrado.copy()
     if skus_selecionados:
-        resultado = resultado[resultado['SKU'].isin(skus_selecionados)]
+        filtro &= df['SKU'].isin(skus_selecionados)
+    resultado = df.loc[filtro]
 
     if resultado.empty:
         st.warning("Nenhum SKU encontrado com os filtros.")
         st.stop()
 
-    # Cálculo individual por SKU, baseado na matriz
-    resultado['Nível de Serviço (%)'] = 0
-    resultado['z'] = 0.0
-    resultado['SS_Calculado'] = 0.0
-    resultado['SS_Arredondado'] = 0
-
-    for idx, row in resultado.iterrows():
-        crit = row['Criticidade']
-        curva = row['Curva']
-
-        if crit in matriz_editada.index and curva in matriz_editada.columns:
-            nivel = matriz_editada.loc[crit, curva]
-            z_val = norm.ppf(nivel / 100.0)
-        else:
-            nivel = 95  # Default se não mapeado
-            z_val = norm.ppf(0.95)
-            st.warning(f"SKU {row['SKU']}: Criticidade '{crit}' ou Curva '{curva}' não mapeada. Usando default 95%.")
-
-        resultado.at[idx, 'Nível de Serviço (%)'] = nivel
-        resultado.at[idx, 'z'] = z_val
-
-        periodo = row['Lead Time médio (meses)'] + 1
-        var_dem = periodo * (row['Desvio Padrão Consumo (un)'] ** 2)
-        var_lt = (row['Consumo Médio Mensal (un)'] ** 2) * (row['Desvio Padrão LT (meses)'] ** 2)
-
-        ss_calc = z_val * np.sqrt(var_dem + var_lt)
-        resultado.at[idx, 'SS_Calculado'] = ss_calc
-        resultado.at[idx, 'SS_Arredondado'] = np.ceil(ss_calc).astype(int)
-
-    # Cobertura em meses
-    consumo = resultado['Consumo Médio Mensal (un)']
-    resultado['Cobertura_Atual_Meses'] = np.where(consumo > 0, resultado['Estoque de Segurança (unidades)'] / consumo, 0)
-    resultado['Cobertura_Calculada_Meses'] = np.where(consumo > 0, resultado['SS_Arredondado'] / consumo, 0)
-
-    # Valor
-    resultado['Valor_SS_Calculado'] = resultado['SS_Arredondado'] * resultado['Valor Unit']
-
-    # Diferenças
-    resultado['Diferença_Unidades'] = resultado['SS_Arredondado'] - resultado['Estoque de Segurança (unidades)']
-    resultado['Diferença_%'] = np.where(
-        resultado['Estoque de Segurança (unidades)'] > 0,
-        ((resultado['SS_Arredondado'] / resultado['Estoque de Segurança (unidades)']) - 1) * 100,
-        np.nan
-    )
-
-    # Tabela final (incluindo novas colunas)
-    tabela = resultado[[
-        'Empresa', 'Classe', 'SKU', 'Descrição_do_Material',
-        'Criticidade', 'Curva', 'Nível de Serviço (%)',
-        'Lead Time médio (meses)', 'Consumo Médio Mensal (un)',
-        'Estoque de Segurança (unidades)', 'SS_Arredondado',
-        'Diferença_Unidades', 'Diferença_%',
-        'Cobertura_Atual_Meses', 'Cobertura_Calculada_Meses',
-        'Valor Unit', 'Valor_SS_Calculado'
-    ]].round(2)
+    chave_dados = pd.util.hash_pandas_object(resultado).to_numpy().tobytes()
+    niveis = tuple(map(tuple, matriz_editada.to_numpy().tolist()))
+    (tabela, matriz_valor, matriz_cobertura, matriz_count,
+     valor_atual, valor_novo, nao_mapeados, excel_bytes) = calcular_estoque_seguranca(resultado, chave_dados, niveis)
 
-    tabela = tabela.rename(columns={
-        'Estoque de Segurança (unidades)': 'SS Atual',
-        'SS_Arredondado': 'SS Calculado',
-        'Valor_SS_Calculado': 'Valor SS Calculado (R$)',
-        'Cobertura_Atual_Meses': 'Cobertura Atual (meses)',
-        'Cobertura_Calculada_Meses': 'Cobertura Calculada (meses)'
-    })
+    for _, row in nao_mapeados.iterrows():
+        st.warning(f"SKU {row['SKU']}: Criticidade '{row['Criticidade']}' ou Curva '{row['Curva']}' não mapeada. Usando default 95%.")
 
     st.markdown(f"### Resultados — {len(tabela)} SKUs")
-    st.dataframe(tabela.style.format({
-        'Valor SS Calculado (R$)': 'R$ {:,.0f}',
-        'Diferença_%': '{:+.1f}%',
-        'Cobertura Atual (meses)': '{:.2f}',
-        'Cobertura Calculada (meses)': '{:.2f}',
-        'Valor Unit': 'R$ {:.2f}',
-        'Nível de Serviço (%)': '{:.0f}%'
-    }), use_container_width=True)
+    # Formatação enviada ao frontend como metadado de coluna (sem Styler)
+    st.dataframe(tabela, column_config={
+        'Valor SS Calculado (R$)': st.column_config.NumberColumn(format="localized"),
+        'Diferença_%': st.column_config.NumberColumn(format="%+.1f%%"),
+        'Cobertura Atual (meses)': st.column_config.NumberColumn(format="%.2f"),
+        'Cobertura Calculada (meses)': st.column_config.NumberColumn(format="%.2f"),
+        'Valor Unit': st.column_config.NumberColumn(format="localized"),
+        'Nível de Serviço (%)': st.column_config.NumberColumn(format="%.0f%%")
+    }, use_container_width=True)
 
     # Resumo financeiro
     c1, c2, c3 = st.columns(3)
-    valor_atual = (tabela['SS Atual'] * tabela['Valor Unit']).sum()
-    valor_novo = tabela['Valor SS Calculado (R$)'].sum()
     impacto = valor_novo - valor_atual
 
     c1.metric("Valor atual do SS", f"R$ {valor_atual:,.0f}")
@@ -269,64 +409,24 @@ if st.button("Calcular Estoque de Segurança", type="primary", use_container_wid
     st.subheader("Resumo por Criticidade (X,Y,Z) e Curva (A,B,C)")
 
     # Matriz 1: Valor Total do Estoque de Segurança Calculado
-    matriz_valor = pd.pivot_table(
-        tabela,
-        values='Valor SS Calculado (R$)',
-        index='Criticidade',
-        columns='Curva',
-        aggfunc='sum',
-        fill_value=0,
-        margins=True,
-        margins_name='Total'
-    )
-    matriz_valor = matriz_valor.reindex(['X', 'Y', 'Z', 'Total'])
-    matriz_valor.columns = pd.Index(list(matriz_valor.columns[:-1]) + ['Total']) if 'Total' in matriz_valor.columns else matriz_valor.columns
     st.write("**Matriz: Valor Total do Estoque de Segurança Calculado (R$)**")
+    # Matrizes 4x4: o Styler é barato aqui e mantém o separador de milhar
     st.dataframe(matriz_valor.style.format("R$ {:,.0f}"), use_container_width=True)
 
     # Matriz 2: Cobertura Total Calculada (soma dos meses)
-    matriz_cobertura = pd.pivot_table(
-        tabela,
-        values='Cobertura Calculada (meses)',
-        index='Criticidade',
-        columns='Curva',
-        aggfunc='mean',
-        fill_value=0,
-        margins=True,
-        margins_name='Total'
-    )
-    matriz_cobertura = matriz_cobertura.reindex(['X', 'Y', 'Z', 'Total'])
-    matriz_cobertura.columns = pd.Index(list(matriz_cobertura.columns[:-1]) + ['Total']) if 'Total' in matriz_cobertura.columns else matriz_cobertura.columns
     st.write("**Matriz: Cobertura Total Calculada **")
     st.dataframe(matriz_cobertura.style.format("{:.2f}"), use_container_width=True)
 
     # Matriz 3: Quantidade de SKUs
-    matriz_count = pd.pivot_table(
-        tabela,
-        values='SKU',
-        index='Criticidade',
-        columns='Curva',
-        aggfunc='count',
-        fill_value=0,
-        margins=True,
-        margins_name='Total'
-    )
-    matriz_count = matriz_count.reindex(['X', 'Y', 'Z', 'Total'])
-    matriz_count.columns = pd.Index(list(matriz_count.columns[:-1]) + ['Total']) if 'Total' in matriz_count.columns else matriz_count.columns
     st.write("**Matriz: Quantidade de SKUs por Mix**")
     st.dataframe(matriz_count, use_container_width=True)
 
     # ========================
     # DOWNLOAD DO RESULTADO
     # ========================
-    buffer = io.BytesIO()
-    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-        tabela.to_excel(writer, index=False, sheet_name='Resultado')
-    buffer.seek(0)
-
     st.download_button(
         label="Baixar resultado completo em Excel",
-        data=buffer.getvalue(),
+        data=excel_bytes,
         file_name="Estoque_Seguranca_Resultado.xlsx",
         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )